@@ -1,40 +1,98 @@
-from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException
+from typing import Optional, List, Dict, Any, Set, Tuple
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.utils import is_body_allowed_for_status_code
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from contextlib import asynccontextmanager # Need this for lifespan
 from pydantic import BaseModel
 import uvicorn
 import logging
+import bisect
+import os
+import time
+import orjson
 # Import the instrumentator
 from prometheus_fastapi_instrumentator import Instrumentator
+from prometheus_client import multiprocess
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor # If using requests library
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 
 
-resource = Resource(attributes={
-    "service.name": "the-app" # Important for identifying your service in traces
-})
+# Module-level logger instead of the root logger; arguments are formatted
+# lazily, only if INFO is enabled for this logger
+logger = logging.getLogger(__name__)
+
+
+# --- Metrics configuration ---
+# Setting ENABLE_METRICS=false skips instrumentation and the /metrics endpoint
+# entirely.
+METRICS_ENABLED = os.getenv("ENABLE_METRICS", "true").lower() in ("1", "true", "yes")
+
+# When running several workers (uvicorn --workers / gunicorn -w), set
+# PROMETHEUS_MULTIPROC_DIR so every worker writes its samples there; the
+# instrumentator then serves /metrics through a MultiProcessCollector that
+# aggregates all workers instead of returning one worker's counters.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+# --- Tracing configuration ---
+# Tracing can be switched off entirely with OTEL_ENABLED=false; in that case no
+# TracerProvider is installed and the app is not instrumented, so requests do
+# not pay for span allocation. When enabled, OTEL_TRACES_SAMPLER_ARG sets the
+# head-based sampling ratio (0.0 - 1.0).
+# The SDK, gRPC exporter and FastAPI instrumentation are imported only when
+# tracing is enabled, so plain deployments don't load grpc/protobuf at all.
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "true").lower() in ("1", "true", "yes")
+OTEL_SAMPLE_RATIO = float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "1.0"))
+
+if OTEL_ENABLED:
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+    # `python main.py` runs this module as __main__ and uvicorn then imports it
+    # again as "main", so only install a provider (and span processor) if none
+    # is set yet; otherwise every span would be exported twice.
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        resource = Resource(attributes={
+            "service.name": "the-app" # Important for identifying your service in traces
+        })
+
+        # Collector's gRPC endpoint. With the collector as a sidecar, point this at
+        # its Unix domain socket (e.g. unix:///var/run/otel/otel.sock) so exports
+        # skip the TCP stack.
+        otlp_exporter = OTLPSpanExporter(
+            endpoint=os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "otel-collector:4317"),
+            insecure=True # Use insecure connection in this example
+        )
+
+        tracer_provider = TracerProvider(
+            resource=resource,
+            sampler=ParentBasedTraceIdRatio(OTEL_SAMPLE_RATIO),
+        )
+
+        # Create a BatchSpanProcessor and add the OTLP exporter to it.
+        # The SDK defaults (queue=2048, delay=5s, batch=512, timeout=30s) drop spans
+        # under bursts, so use tuned values that can be overridden via the standard
+        # OTEL_BSP_* environment variables.
+        span_processor = BatchSpanProcessor(
+            otlp_exporter,
+            max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+            schedule_delay_millis=float(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+            max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+            export_timeout_millis=float(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+        )
+        # add the span processor to the tracer provider
+        tracer_provider.add_span_processor(span_processor)
+        trace.set_tracer_provider(tracer_provider)
 
-otlp_exporter = OTLPSpanExporter(
-    endpoint="otel-collector:4317", # Collector's gRPC endpoint
-    insecure=True # Use insecure connection in this example
-)
-
-
-trace.set_tracer_provider(TracerProvider(resource=resource))
 tracer = trace.get_tracer(__name__)
 
 
-# Create a BatchSpanProcessor and add the OTLP exporter to it
-span_processor = BatchSpanProcessor(otlp_exporter)
-# add the span processor to the tracer provider
-trace.get_tracer_provider().add_span_processor(span_processor)
-
-
 # --- Define the lifespan context manager ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -44,22 +102,117 @@ async def lifespan(app: FastAPI):
     # --- Expose metrics on startup ---
     # Ensure the instrumentator is available here or passed appropriately if needed,
     # but since it's defined globally below, it should be accessible.
-    instrumentator.expose(app)
-    logging.info("Startup complete. Metrics exposed.") # Optional print statement
+    if METRICS_ENABLED:
+        instrumentator.expose(app)
+    # --- Warm up one-time work before serving traffic ---
+    # Build (and cache) the OpenAPI schema after all routes, including
+    # /metrics, are registered, so the first /docs or /openapi.json hit
+    # doesn't pay for it.
+    app.openapi()
+    logger.info("Startup complete. Metrics exposed: %s", METRICS_ENABLED)
     yield
     # --- Code here would run on shutdown ---
-    logging.info("Shutdown complete.")
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Drop this worker's live gauge files so they stop being aggregated
+        multiprocess.mark_process_dead(os.getpid())
+    logger.info("Shutdown complete.")
+
+# --- Response cache middleware ---
+class ResponseCacheMiddleware:
+    """
+    Caches successful GET responses for the given path prefixes in process
+    memory for max_age seconds. Any write (POST/PUT/PATCH/DELETE) under one of
+    those prefixes drops the whole cache.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cached_paths: Tuple[str, ...],
+        max_age: float = 60.0,
+        max_entries: int = 1024,
+    ) -> None:
+        self.app = app
+        self.cached_paths = cached_paths
+        self.max_age = max_age
+        self.max_entries = max_entries
+        # (path, query_string) -> (expires_at, status, headers, body)
+        self._cache: Dict[Tuple[str, bytes], Tuple[float, int, List[Tuple[bytes, bytes]], bytes]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.cached_paths):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] != "GET":
+            if scope["method"] in ("POST", "PUT", "PATCH", "DELETE"):
+                self._cache.clear()
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["path"], scope["query_string"])
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            _, status, headers, body = cached
+            # Send a fresh list: outer middleware (e.g. OTel's response
+            # propagator) may append to the headers in place
+            await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status = 0
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def send_and_store(message: Message) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and status == 200:
+                    if len(self._cache) >= self.max_entries:
+                        # Evict the oldest entry (dicts keep insertion order)
+                        self._cache.pop(next(iter(self._cache)))
+                    self._cache[key] = (now + self.max_age, status, headers, b"".join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, send_and_store)
+
 
 # Create a FastAPI application instance, passing the lifespan manager
-app = FastAPI(title="FastAPI Simple Endpoints", lifespan=lifespan)
+app = FastAPI(
+    title="FastAPI Simple Endpoints",
+    default_response_class=ORJSONResponse, # orjson encodes dict responses much faster than stdlib json
+    lifespan=lifespan,
+)
+
+# --- Cache item lookups and searches ---
+# Added before the instrumentation below so it stays the innermost layer and
+# cache hits are still counted in metrics and traces. POST /items/ falls under
+# the "/items/" prefix, so creating an item invalidates the cache.
+app.add_middleware(ResponseCacheMiddleware, cached_paths=("/items/", "/search/"), max_age=60)
 
 # --- Instrument the app AFTER creating it ---
-# This automatically adds /metrics endpoint and tracks requests
-instrumentator = Instrumentator().instrument(app)
+# This automatically adds /metrics endpoint and tracks requests.
+# The scrape endpoint and the health check are excluded so they don't pay for
+# histogram observations (and /metrics doesn't measure itself).
+instrumentator = Instrumentator(
+    excluded_handlers=["^/metrics$", "^/status$"],
+    should_group_status_codes=True,
+    should_ignore_untemplated=True,
+)
+if METRICS_ENABLED:
+    instrumentator.instrument(app)
 
 # Note: expose(app) is now called within the lifespan manager above
 
-FastAPIInstrumentor.instrument_app(app)
+if OTEL_ENABLED:
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    FastAPIInstrumentor.instrument_app(app)
 
 # Define a simple request body model for a POST request
 FAKE_ITEMS_DB: Dict[int, Dict[str, Any]] = {
@@ -76,6 +229,60 @@ ALL_ITEMS: List[Dict[str, Any]] = [
     {"name": "webcam", "price": 50},
 ]
 
+# Lowercased names are precomputed once so searches don't call str.lower() per item
+ALL_ITEMS_LC: List[Tuple[Dict[str, Any], str]] = [
+    (item, item["name"].lower()) for item in ALL_ITEMS
+]
+
+# Price column in catalogue order, so filters don't index into each item dict
+_ITEM_PRICES: List[float] = [item["price"] for item in ALL_ITEMS]
+
+# Price index: (position in ALL_ITEMS, item) sorted by price, with a parallel
+# list of prices so min_price can be resolved with bisect
+_SORTED_BY_PRICE: List[Tuple[int, Dict[str, Any]]] = sorted(
+    enumerate(ALL_ITEMS), key=lambda entry: _ITEM_PRICES[entry[0]]
+)
+_PRICES: List[float] = [_ITEM_PRICES[pos] for pos, _ in _SORTED_BY_PRICE]
+
+# Suffix array over the lowercased names: every (suffix, position) pair,
+# sorted. Names containing a query are exactly those with a suffix that starts
+# with it, which is a contiguous run found by bisect.
+_SUFFIX_INDEX: List[Tuple[str, int]] = sorted(
+    (lc_name[i:], pos)
+    for pos, (_, lc_name) in enumerate(ALL_ITEMS_LC)
+    for i in range(len(lc_name))
+)
+_SUFFIXES: List[str] = [suffix for suffix, _ in _SUFFIX_INDEX]
+
+
+def _positions_containing(name_lc: str) -> Set[int]:
+    """Positions in ALL_ITEMS whose lowercased name contains name_lc."""
+    positions: Set[int] = set()
+    for i in range(bisect.bisect_left(_SUFFIXES, name_lc), len(_SUFFIXES)):
+        suffix, pos = _SUFFIX_INDEX[i]
+        if not suffix.startswith(name_lc):
+            break
+        positions.add(pos)
+    return positions
+
+# Static response bodies are serialized once at import and sent as raw bytes,
+# bypassing jsonable_encoder on every request
+_ROOT_BODY = orjson.dumps({"message": "Welcome to the FastAPI application!"})
+_STATUS_BODY = orjson.dumps({"status": "healthy", "version": "1.0"})
+
+_ERR_400_BODY = orjson.dumps({"detail": "Bad Request"})
+_ERR_404_BODY = orjson.dumps({"detail": "Item not found"})
+_ERR_500_BODY = orjson.dumps({"detail": "Internal Server Error"})
+
+_ERROR_BODIES: Dict[Tuple[int, str], bytes] = {
+    (404, "Item not found"): _ERR_404_BODY,
+}
+
+# Shared instance raised on every unknown item id instead of building a new
+# exception per miss. Raise it via .with_traceback(None) so tracebacks from
+# earlier raises don't pile up on the instance.
+ITEM_NOT_FOUND = HTTPException(status_code=404, detail="Item not found")
+
 # --- Pydantic Models ---
 class Item(BaseModel):
     name: str
@@ -83,54 +290,101 @@ class Item(BaseModel):
     is_offer: Optional[bool] = None
 
 
+# --- Exception Handlers ---
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException) -> Response:
+    # 1xx, 204 and 304 responses must not carry a body
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=exc.headers)
+    # Known errors reuse their cached body; anything else is encoded on the fly
+    body = _ERROR_BODIES.get((exc.status_code, exc.detail)) if isinstance(exc.detail, str) else None
+    if body is None:
+        body = orjson.dumps({"detail": exc.detail})
+    return Response(
+        content=body,
+        status_code=exc.status_code,
+        headers=exc.headers,
+        media_type="application/json",
+    )
+
+
 # --- Endpoints ---
+# Return annotations are documentation only: response_model=None stops FastAPI
+# from building a cloned response field per route and re-validating every
+# response against it.
+# Handlers doing constant-time work stay `async def` and run inline on the event
+# loop; handlers whose cost grows with the catalogue are plain `def` so FastAPI
+# runs them in its threadpool and the loop keeps accepting connections.
 
 @app.get("/", summary="Root endpoint")
-async def read_root() -> Dict[str, str]:
-    return {"message": "Welcome to the FastAPI application!"}
+async def read_root() -> Response:
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
-@app.get("/items/{item_id}", summary="Get item by ID")
+@app.get("/items/{item_id}", summary="Get item by ID", response_model=None)
 async def read_item(item_id: int) -> Dict[str, Any]:
     if item_id not in FAKE_ITEMS_DB:
-        raise HTTPException(status_code=404, detail="Item not found")
+        raise ITEM_NOT_FOUND.with_traceback(None)
     return {"item_id": item_id, **FAKE_ITEMS_DB[item_id]}
 
 
-@app.get("/search/", summary="Search items by name and min price")
-async def search_items(
-    name: Optional[str] = None,
-    min_price: float = 0
+@app.get("/search/", summary="Search items by name and min price", response_model=None)
+def search_items(
+    name: Optional[str] = Query(None, min_length=1),
+    min_price: float = Query(0, ge=0)
 ) -> Dict[str, List[Dict[str, Any]]]:
-    results = [
-        item for item in ALL_ITEMS
-        if (name is None or name.lower() in item["name"].lower())
-        and item["price"] >= min_price
-    ]
+    # Fast path: no name filter and a floor at or below the cheapest item
+    # matches the whole catalogue, which is already in order
+    if name is None and min_price <= _PRICES[0]:
+        return {"search_results": ALL_ITEMS}
+    if name is None:
+        # Everything from the first price >= min_price onwards matches; sort
+        # back into catalogue order (positions are unique, items never compared)
+        candidates = _SORTED_BY_PRICE[bisect.bisect_left(_PRICES, min_price):]
+        results = [item for _, item in sorted(candidates)]
+    else:
+        # The query is lowered once; the price floor is checked on the flat
+        # price column for the (few) name matches only
+        results = [
+            ALL_ITEMS[pos] for pos in sorted(_positions_containing(name.lower()))
+            if _ITEM_PRICES[pos] >= min_price
+        ]
     return {"search_results": results}
 
 
-@app.post("/items/", summary="Create a new item")
+@app.post("/items/", summary="Create a new item", response_model=None)
 async def create_item(item: Item) -> Dict[str, Any]:
-    return {"message": "Item created successfully", "item": item.dict()}
+    return {"message": "Item created successfully", "item": item}
 
 
 @app.get("/status", summary="Get API health status")
-async def get_status() -> Dict[str, str]:
-    return {"status": "healthy", "version": "1.0"}
+async def get_status() -> Response:
+    return Response(content=_STATUS_BODY, media_type="application/json")
 
 
 @app.get("/error-500", summary="Simulate internal server error")
-async def get_error_500():
-    raise HTTPException(status_code=500, detail="Internal Server Error")
+async def get_error_500() -> Response:
+    return Response(content=_ERR_500_BODY, status_code=500, media_type="application/json")
 
 
 @app.get("/error-400", summary="Simulate bad request error")
-async def get_error_400():
-    raise HTTPException(status_code=400, detail="Bad Request")
+async def get_error_400() -> Response:
+    return Response(content=_ERR_400_BODY, status_code=400, media_type="application/json")
 
 
 # Optional: Add a block to run the application directly with Uvicorn
 if __name__ == "__main__":
     # --- Keep port 5060 for consistency ---
-    uvicorn.run("main:app", host="0.0.0.0", port=5060, reload=True)
\ No newline at end of file
+    if os.getenv("DEV", "false").lower() in ("1", "true", "yes"):
+        # Auto-reload for local development (single process, default loop)
+        uvicorn.run("main:app", host="0.0.0.0", port=5060, reload=True)
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=5060,
+            loop="uvloop",
+            http="httptools",
+            workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        )
\ No newline at end of file